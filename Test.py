@@ -3,181 +3,763 @@ from unittest.mock import patch, MagicMock
 import socket
 import threading
 import pickle
+import io
+import contextlib
+import random
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
 
 # Import the server and client modules
 import server2 
 import client2 
+import tournament
+import harness
+import scheduler
+import replay
+import analyzer
+
+BENCHMARK_GAMES = 2000
+suite_start = None
+
+def setUpModule():
+    global suite_start
+    suite_start = time.perf_counter()
+
+def tearDownModule():
+    print(f"\nSuite runtime: {time.perf_counter() - suite_start:.2f}s")
+
+# Every ship in its own row, starting at the left edge
+LAYOUT = {"Carrier": (0, 0, "H"), "Battleship": (1, 0, "H"), "Cruiser": (2, 0, "H"),
+          "Submarine": (3, 0, "H"), "Destroyer": (4, 0, "H")}
+
+def wait_for(condition, timeout=5):
+    """Poll until condition() is true, failing after timeout seconds."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.01)
 
 class TestBattleshipGame(unittest.TestCase):
 
+    def setUp(self):
+        server2.reset_game()
+        self.conns = [harness.MemoryConnection(), harness.MemoryConnection()]
+        server2.clients.extend(self.conns)
+        quiet = harness.quiet()
+        quiet.__enter__()
+        self.addCleanup(quiet.__exit__, None, None, None)
+
+    def send(self, player_id, message):
+        """Send a message from a player and return what the server sent back to them."""
+        sent_before = len(self.conns[player_id].sent)
+        server2.handle_message(self.conns[player_id], player_id, message)
+        return self.conns[player_id].messages[sent_before:]
+
+    def place_all(self):
+        """Place every ship for both players and start combat with Player 1's turn."""
+        for player_id in range(2):
+            for message in harness.placement_messages(LAYOUT):
+                self.send(player_id, message)
+        server2.turn = 0
+        server2.start_turn_timer()
+
+    @patch.object(server2, 'reaper_loop')
     @patch('server2.socket.socket')
-    def test_server_startup(self, mock_socket):
+    def test_server_startup(self, mock_socket, mock_reaper_loop):
         """Test server startup and client connections."""
         mock_socket_instance = mock_socket.return_value
+        pipes = [os.pipe() for _ in range(2)]  # Each player disconnects once the write end is closed
+        conns = [MagicMock(**{"makefile.return_value": os.fdopen(read_end, "rb")}) for read_end, _ in pipes]
         mock_socket_instance.accept.side_effect = [
-            (MagicMock(), ('127.0.0.1', 12345)),
-            (MagicMock(), ('127.0.0.1', 12346))
+            (conns[0], ('127.0.0.1', 12345)),
+            (conns[1], ('127.0.0.1', 12346))
         ]
+        server2.clients.clear()
 
         server_thread = threading.Thread(target=server2.main)
         server_thread.start()
+        server_thread.join()
+        for _, write_end in pipes:
+            os.close(write_end)
+        wait_for(lambda: all(conn.close.called for conn in conns))
 
         self.assertTrue(mock_socket_instance.bind.called)
         self.assertTrue(mock_socket_instance.listen.called)
         self.assertEqual(len(server2.clients), 2)
+        self.assertTrue(mock_reaper_loop.called)
 
-        server_thread.join()
-
-    @patch('client2.socket.socket')
-    def test_client_connection(self, mock_socket):
-        """Test client connection to the server."""
-        mock_socket_instance = mock_socket.return_value
-        mock_socket_instance.recv.return_value = pickle.dumps({"type": "start", "player_id": 0})
-
-        client_thread = threading.Thread(target=client2.main)
-        client_thread.start()
-
-        self.assertTrue(mock_socket_instance.connect.called)
-        self.assertTrue(mock_socket_instance.recv.called)
-
-        client_thread.join()
-
-    @patch('server2.socket.socket')
-    def test_ship_placement(self, mock_socket):
+    def test_ship_placement(self):
         """Test ship placement by a player."""
-        mock_socket_instance = mock_socket.return_value
-        mock_socket_instance.recv.side_effect = [
-            pickle.dumps({"type": "place_ship", "ship": "Submarine", "coords": (0, 0), "orientation": "H"}),
-            pickle.dumps({"type": "place_ship", "ship": "Submarine", "coords": (1, 0), "orientation": "V"})
-        ]
+        replies = self.send(0, {"type": "place_ship", "ship": "Submarine", "coords": (0, 0), "orientation": "H"})
 
-        server_thread = threading.Thread(target=server2.main)
-        server_thread.start()
-
-        self.assertTrue(mock_socket_instance.send.called)
+        self.assertEqual(replies[0]["type"], "ship_placed")
         self.assertIn("Submarine", server2.ship_placements[0])
+        self.assertEqual(server2.player_boards[0][0][:2], ["S", "S"])
 
-        server_thread.join()
+    def test_all_ships_placed(self):
+        """Test that combat starts once both players have placed every ship."""
+        for player_id in range(2):
+            for message in harness.placement_messages(LAYOUT):
+                self.send(player_id, message)
 
-    @patch('server2.socket.socket')
-    def test_attack_handling(self, mock_socket):
-        """Test attack handling by a player."""
-        mock_socket_instance = mock_socket.return_value
-        mock_socket_instance.recv.side_effect = [
-            pickle.dumps({"type": "attack", "coords": (0, 0)}),
-            pickle.dumps({"type": "attack", "coords": (1, 1)})
-        ]
+        self.assertEqual(server2.phase, "combat")
+        self.assertEqual(self.conns[server2.turn].messages[-1]["type"], "your_turn")
+        self.assertEqual(self.conns[1 - server2.turn].messages[-1]["type"], "wait_turn")
 
-        server_thread = threading.Thread(target=server2.main)
-        server_thread.start()
+    def test_attack_handling(self):
+        """Test attack handling by a player."""
+        self.place_all()
+        replies = self.send(0, {"type": "attack", "coords": (0, 0)})
 
-        self.assertTrue(mock_socket_instance.send.called)
+        self.assertEqual(replies[0], {"type": "attack_result", "result": "hit", "coords": (0, 0)})
         self.assertEqual(server2.attack_boards[0][0][0], "X")
+        self.assertEqual(server2.player_boards[1][0][0], "c")
 
-        server_thread.join()
-
-    @patch('client2.socket.socket')
-    def test_game_over(self, mock_socket):
-        """Test game over scenario."""
-        mock_socket_instance = mock_socket.return_value
-        mock_socket_instance.recv.side_effect = [
-            pickle.dumps({"type": "game_over", "message": "Player 1 Wins!"})
-        ]
-
-        client_thread = threading.Thread(target=client2.main)
-        client_thread.start()
-
-        self.assertTrue(mock_socket_instance.recv.called)
-        self.assertTrue(client2.game_over)
-
-        client_thread.join()
-
-    @patch('server2.socket.socket')
-    def test_invalid_ship_placement(self, mock_socket):
+    def test_invalid_ship_placement(self):
         """Test invalid ship placement by a player."""
-        mock_socket_instance = mock_socket.return_value
-        mock_socket_instance.recv.return_value = pickle.dumps({"type": "place_ship", "ship": "Submarine", "coords": (0, 0), "orientation": "H"})
+        replies = self.send(0, {"type": "place_ship", "ship": "Submarine", "coords": (0, 9), "orientation": "H"})
 
-        server_thread = threading.Thread(target=server2.main)
-        server_thread.start()
-
-        self.assertTrue(mock_socket_instance.send.called)
+        self.assertEqual(replies, [{"type": "error", "message": "Invalid placement."}])
         self.assertNotIn("Submarine", server2.ship_placements[0])
 
-        server_thread.join()
-
-    @patch('server2.socket.socket')
-    def test_duplicate_ship_placement(self, mock_socket):
+    def test_duplicate_ship_placement(self):
         """Test duplicate ship placement by a player."""
-        mock_socket_instance = mock_socket.return_value
-        mock_socket_instance.recv.side_effect = [
-            pickle.dumps({"type": "place_ship", "ship": "Submarine", "coords": (0, 0), "orientation": "H"}),
-            pickle.dumps({"type": "place_ship", "ship": "Submarine", "coords": (1, 0), "orientation": "V"})
-        ]
+        self.send(0, {"type": "place_ship", "ship": "Submarine", "coords": (0, 0), "orientation": "H"})
+        replies = self.send(0, {"type": "place_ship", "ship": "Submarine", "coords": (1, 0), "orientation": "V"})
 
-        server_thread = threading.Thread(target=server2.main)
-        server_thread.start()
-
-        self.assertTrue(mock_socket_instance.send.called)
+        self.assertEqual(replies, [{"type": "error", "message": "Ship already placed."}])
         self.assertEqual(len(server2.ship_placements[0]), 1)
 
-        server_thread.join()
-
-    @patch('server2.socket.socket')
-    def test_turn_switching(self, mock_socket):
+    def test_turn_switching(self):
         """Test turn switching between players."""
-        mock_socket_instance = mock_socket.return_value
-        mock_socket_instance.recv.side_effect = [
-            pickle.dumps({"type": "attack", "coords": (0, 0)}),
-            pickle.dumps({"type": "attack", "coords": (1, 1)})
-        ]
-
-        server_thread = threading.Thread(target=server2.main)
-        server_thread.start()
+        self.place_all()
+        self.send(0, {"type": "attack", "coords": (9, 9)})
 
-        self.assertTrue(mock_socket_instance.send.called)
         self.assertEqual(server2.turn, 1)
-
-        server_thread.join()
-
+        self.assertEqual(self.conns[1].messages[-1]["type"], "your_turn")
+
+    def test_attack_out_of_turn(self):
+        """Test that a player cannot attack on the opponent's turn."""
+        self.place_all()
+        replies = self.send(1, {"type": "attack", "coords": (0, 0)})
+
+        self.assertEqual(replies, [{"type": "error", "message": "Not your turn."}])
+        self.assertEqual(server2.attack_boards[1][0][0], "_")
+
+    def test_ship_sunk_switches_turn_once(self):
+        """Test that sinking a ship notifies both players and passes the turn exactly once."""
+        self.place_all()
+        for col in range(2):
+            server2.turn = 0
+            sent_before = len(self.conns[1].sent)
+            self.send(0, {"type": "attack", "coords": (4, col)})
+
+        opponent_messages = [m["type"] for m in self.conns[1].messages[sent_before:]]
+        self.assertEqual(opponent_messages, ["opponent_hit", "ship_sunk", "your_turn"])
+        self.assertEqual(server2.ships_sunk[1], 1)
+
+    def test_full_game(self):
+        """Test a full scripted game through to game over."""
+        result = harness.play_game([LAYOUT, LAYOUT], [[(row, col) for row in range(10) for col in range(10)]] * 2, seed=1)
+
+        self.assertEqual(result["winner"], result["first"])  # Identical scripts, so the first mover wins
+        self.assertEqual(result["attacks"], 2 * 42 - 1)  # The last ship cell is (4, 1), the 42nd shot
+        for conn in result["connections"]:
+            self.assertEqual(conn.messages[-1]["type"], "game_over")
+        self.assertEqual(server2.phase, "over")
+        self.assertEqual(len(server2.deadlines), 0)
+
+    def test_idle_player_forfeits(self):
+        """Test that a player who stops responding forfeits the match."""
+        self.place_all()
+        now = time.monotonic()
+        server2.deadlines.schedule(("idle", 0), now + 1)
+        server2.deadlines.schedule(("idle", 1), now + 1000)
+        reaped = server2.matches_reaped
+
+        server2.reap_expired(now + 2)
+
+        self.assertEqual(server2.phase, "over")
+        self.assertEqual(server2.matches_reaped, reaped + 1)
+        for conn in self.conns:
+            self.assertEqual(conn.messages[-1], {"type": "game_over", "message": "Player 1 stopped responding. Player 2 Wins!"})
+            self.assertTrue(conn.closed)
+
+    def test_turn_timeout_forfeits(self):
+        """Test that a player who does not attack in time forfeits the match."""
+        self.place_all()
+        self.send(0, {"type": "attack", "coords": (9, 9)})
+
+        server2.reap_expired(time.monotonic() + server2.TURN_TIMEOUT - 1)
+        self.assertEqual(server2.phase, "combat")
+        server2.reap_expired(time.monotonic() + server2.TURN_TIMEOUT + 1)
+
+        self.assertEqual(server2.phase, "over")
+        self.assertEqual(self.conns[0].messages[-1]["message"], "Player 2 ran out of time. Player 1 Wins!")
+
+    def test_attack_restarts_turn_timer(self):
+        """Test that only the player whose turn it is has a turn deadline."""
+        self.place_all()
+        self.assertIn(("turn", 0), server2.deadlines)
+        self.send(0, {"type": "attack", "coords": (9, 9)})
+
+        self.assertNotIn(("turn", 0), server2.deadlines)
+        self.assertIn(("turn", 1), server2.deadlines)
+
+    def test_heartbeat(self):
+        """Test that heartbeats are sent when due and rescheduled."""
+        now = time.monotonic()
+        server2.deadlines.schedule(("heartbeat", 0), now)
+
+        server2.reap_expired(now)
+
+        self.assertEqual(self.conns[0].messages, [{"type": "heartbeat"}])
+        self.assertEqual(server2.deadlines.deadline(("heartbeat", 0)), now + server2.HEARTBEAT_INTERVAL)
+
+    def test_abandoned_connection_is_reaped(self):
+        """Test that reaping an idle client unblocks both connection handlers."""
+        server2.reset_game()
+        pairs = [socket.socketpair(), socket.socketpair()]
+        server2.clients.extend(server_end for server_end, _ in pairs)
+        readers = [client_end.makefile("rb") for _, client_end in pairs]
+        threads = [threading.Thread(target=server2.handle_client, args=(server_end, player_id))
+                   for player_id, (server_end, _) in enumerate(pairs)]
+        for thread in threads:
+            thread.start()
+        for reader in readers:
+            self.assertEqual(pickle.load(reader)["type"], "start")
+        wait_for(lambda: ("idle", 1) in server2.deadlines)
+
+        with server2.game_lock:
+            server2.reap_expired(time.monotonic() + server2.IDLE_TIMEOUT + 1)
+        for thread in threads:
+            thread.join(timeout=5)
+            self.assertFalse(thread.is_alive())
+
+        for reader in readers:
+            messages = []
+            with self.assertRaises(EOFError):
+                while True:
+                    messages.append(pickle.load(reader))
+            self.assertEqual(messages[-1]["type"], "game_over")
+        for reader, (_, client_end) in zip(readers, pairs):
+            reader.close()
+            client_end.close()
+
+    def test_forfeit_stops_reaping_batch(self):
+        """Test that keys after a forfeit in the same batch do not reschedule anything."""
+        self.place_all()
+        now = time.monotonic()
+        server2.deadlines.schedule(("idle", 0), now)
+        server2.deadlines.schedule(("heartbeat", 1), now + 0.5)
+
+        server2.reap_expired(now + 1)
+
+        self.assertEqual(server2.phase, "over")
+        self.assertEqual(len(server2.deadlines), 0)
+        self.assertNotIn({"type": "heartbeat"}, self.conns[1].messages)
+
+    @unittest.skipUnless(hasattr(socket, "MSG_DONTWAIT"), "send_nowait() blocks without MSG_DONTWAIT")
+    def test_stalled_player_does_not_block_reaper(self):
+        """Test that a player whose receive buffer is full is reaped instead of blocking the reaper."""
+        server_end, client_end = socket.socketpair()
+        self.addCleanup(client_end.close)
+        self.addCleanup(server_end.close)
+        server2.clients[0] = server_end
+        while True:  # Fill the buffers of a client that never reads
+            try:
+                server_end.send(b"x" * 65536, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                break
+        now = time.monotonic()
+        server2.deadlines.schedule(("heartbeat", 0), now)
+        reaped = server2.matches_reaped
+
+        def reap():
+            with server2.game_lock:
+                server2.reap_expired(now)
+        reaper = threading.Thread(target=reap)
+        reaper.start()
+        reaper.join(timeout=5)
+
+        self.assertFalse(reaper.is_alive())
+        self.assertEqual(server2.phase, "over")
+        self.assertEqual(server2.matches_reaped, reaped + 1)
+        self.assertEqual(self.conns[1].messages[-1]["type"], "game_over")
+
+    def run_handler(self, client_action):
+        """Run handle_client for Player 1 over a socketpair, apply client_action to the client end, and wait for it to exit."""
+        server_end, client_end = socket.socketpair()
+        self.addCleanup(client_end.close)
+        server2.clients[0] = server_end
+        handler = threading.Thread(target=server2.handle_client, args=(server_end, 0), daemon=True)
+        handler.start()
+        wait_for(lambda: ("idle", 0) in server2.deadlines)  # "start" has been sent
+        with contextlib.redirect_stderr(io.StringIO()):  # handle_client prints tracebacks for errors
+            client_action(client_end)
+            handler.join(timeout=5)
+        self.assertFalse(handler.is_alive())
+
+    def test_connection_reset_forfeits(self):
+        """Test that a reset connection forfeits at once, like a clean disconnect."""
+        self.run_handler(socket.socket.close)  # Closing with "start" unread resets the connection
+
+        self.assertEqual(server2.phase, "over")
+        self.assertEqual(self.conns[1].messages[-1], {"type": "game_over", "message": "Player 1 left the game. Player 2 Wins!"})
+
+    def test_garbled_message_forfeits(self):
+        """Test that a message that cannot be unpickled forfeits the sender."""
+        self.run_handler(lambda client_end: client_end.sendall(b"not a pickle"))
+
+        self.assertEqual(server2.phase, "over")
+        self.assertEqual(self.conns[1].messages[-1],
+                         {"type": "game_over", "message": "Player 1 was disconnected after an error. Player 2 Wins!"})
+
+    @unittest.skipUnless(hasattr(socket, "MSG_DONTWAIT"), "send_nowait() blocks without MSG_DONTWAIT")
+    def test_player_who_never_reads_is_reaped(self):
+        """Test that a player who keeps sending but never reads forfeits instead of stalling game_lock."""
+        server_end, client_end = socket.socketpair()
+        self.addCleanup(client_end.close)
+        server_end.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)  # Fill up quickly
+        server2.clients[1] = server_end
+        self.place_all()
+        handler = threading.Thread(target=server2.handle_client, args=(server_end, 1), daemon=True)
+        handler.start()
+
+        def spam():
+            """Attack out of turn over and over without reading a single reply."""
+            attack = pickle.dumps({"type": "attack", "coords": (0, 0)})
+            try:
+                while server2.phase != "over":
+                    client_end.sendall(attack)
+            except OSError:
+                pass  # The server shut the connection down
+        spammer = threading.Thread(target=spam, daemon=True)  # Daemons, so a regression fails rather than hangs
+        spammer.start()
+        wait_for(lambda: server2.phase == "over")
+
+        self.assertTrue(server2.game_lock.acquire(timeout=2))
+        server2.game_lock.release()
+        self.assertEqual(self.conns[0].messages[-1], {"type": "game_over", "message": "Player 2 stopped responding. Player 1 Wins!"})
+        spammer.join(timeout=5)
+        handler.join(timeout=5)
+        self.assertFalse(spammer.is_alive())
+        self.assertFalse(handler.is_alive())
+
+    @patch.object(server2, 'HEARTBEAT_INTERVAL', 0.05)
+    @patch.object(server2, 'IDLE_TIMEOUT', 0.3)
+    def test_late_opponent_does_not_reap_waiting_player(self):
+        """Test that a player waiting for a slow opponent is kept alive by heartbeats."""
+        server2.reset_game()
+        pairs = [socket.socketpair(), socket.socketpair()]
+        opponent_arrives = threading.Event()
+        accepts = iter(range(2))
+
+        def accept():
+            player_id = next(accepts)
+            if player_id == 1:
+                opponent_arrives.wait(5)
+            return pairs[player_id][0], ('127.0.0.1', 12345 + player_id)
+
+        received = [[], []]
+        def respond(player_id):
+            """Answer heartbeats like client2 does."""
+            client_end = pairs[player_id][1]
+            reader = client_end.makefile("rb")
+            try:
+                while True:
+                    message = pickle.load(reader)
+                    received[player_id].append(message)
+                    if message["type"] == "heartbeat":
+                        client_end.sendall(pickle.dumps({"type": "heartbeat_ack"}))
+            except (EOFError, OSError):
+                pass
+            finally:
+                reader.close()
+        responders = [threading.Thread(target=respond, args=(player_id,)) for player_id in range(2)]
+        for responder in responders:
+            responder.start()
+        reaped = server2.matches_reaped
+
+        with patch('server2.socket.socket') as mock_socket:  # Patched only now so the socketpairs are real
+            mock_socket.return_value.accept.side_effect = accept
+            server_thread = threading.Thread(target=server2.main)
+            server_thread.start()
+            time.sleep(5 * server2.IDLE_TIMEOUT)  # The opponent joins well after the idle timeout
+            opponent_arrives.set()
+            server_thread.join()
+        time.sleep(2 * server2.IDLE_TIMEOUT)
+
+        self.assertEqual(server2.phase, "placement")
+        self.assertEqual(server2.matches_reaped, reaped)
+        self.assertIn({"type": "heartbeat"}, received[0])
+
+        for _, client_end in pairs:
+            client_end.shutdown(socket.SHUT_RDWR)  # Disconnecting ends the match, which stops the reaper
+            client_end.close()
+        for responder in responders:
+            responder.join(timeout=5)
+        wait_for(lambda: not any(thread.name == "reaper" for thread in threading.enumerate()))
+        for server_end, _ in pairs:
+            server_end.close()
+
+    def test_opponent_arriving_after_match_ended_is_turned_away(self):
+        """Test that a player who connects after the first player left gets game_over instead of waiting forever."""
+        server2.reset_game()
+        pairs = [socket.socketpair(), socket.socketpair()]
+        opponent_arrives = threading.Event()
+        accepts = iter(range(2))
+
+        def accept():
+            player_id = next(accepts)
+            if player_id == 1:
+                opponent_arrives.wait(5)
+            return pairs[player_id][0], ('127.0.0.1', 12345 + player_id)
+
+        with patch('server2.socket.socket') as mock_socket:  # Patched only now so the socketpairs are real
+            mock_socket.return_value.accept.side_effect = accept
+            server_thread = threading.Thread(target=server2.main, daemon=True)
+            server_thread.start()
+            first_reader = pairs[0][1].makefile("rb")
+            self.assertEqual(pickle.load(first_reader)["type"], "start")
+            pairs[0][1].shutdown(socket.SHUT_RDWR)  # The first player leaves while waiting
+            wait_for(lambda: server2.phase == "over")
+            opponent_arrives.set()
+            server_thread.join(timeout=5)
+        self.assertFalse(server_thread.is_alive())
+
+        pairs[1][1].settimeout(5)  # Before the fix the late player waited forever
+        late_reader = pairs[1][1].makefile("rb")
+        messages = []
+        with self.assertRaises(EOFError):
+            while True:
+                messages.append(pickle.load(late_reader))
+        self.assertEqual(messages, [{"type": "game_over", "message": "The match has already ended."}])
+        self.assertEqual(len(server2.clients), 1)
+
+        wait_for(lambda: not any(thread.name == "reaper" for thread in threading.enumerate()))
+        for reader in (first_reader, late_reader):
+            reader.close()
+        for server_end, client_end in pairs:
+            server_end.close()
+            client_end.close()
+
+class TestClient(unittest.TestCase):
+
+    def setUp(self):
+        client2.your_turn = False
+        client2.game_over = False
+        for name in ("update_notification", "update_boards", "show_game_over_popup", "disable_all_buttons", "messagebox"):
+            patcher = patch.object(client2, name)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    @patch.object(client2, 'threading')
+    @patch.object(client2, 'tkFont')
+    @patch.object(client2, 'tk')
     @patch('client2.socket.socket')
-    def test_ship_sunk_notification(self, mock_socket):
-        """Test ship sunk notification to the client."""
+    def test_client_connection(self, mock_socket, mock_tk, mock_font, mock_threading):
+        """Test client connection to the server."""
         mock_socket_instance = mock_socket.return_value
-        mock_socket_instance.recv.return_value = pickle.dumps({"type": "ship_sunk", "message": "Player 1 has sunk Player 2's Submarine!"})
+        mock_socket_instance.makefile.return_value = io.BytesIO(pickle.dumps({"type": "start", "player_id": 0}))
 
-        client_thread = threading.Thread(target=client2.main)
-        client_thread.start()
+        client2.main()
 
-        self.assertTrue(mock_socket_instance.recv.called)
-
-        client_thread.join()
-
-    @patch('client2.socket.socket')
-    def test_wait_turn_notification(self, mock_socket):
-        """Test wait turn notification to the client."""
-        mock_socket_instance = mock_socket.return_value
-        mock_socket_instance.recv.return_value = pickle.dumps({"type": "wait_turn", "message": "Waiting for your opponent's turn."})
+        self.assertTrue(mock_socket_instance.connect.called)
+        self.assertTrue(mock_socket_instance.makefile.called)
+        self.assertEqual(client2.player_id, 0)
+        mock_threading.Thread.assert_called_once_with(target=client2.receive_data, daemon=True)
+        self.assertTrue(mock_tk.Tk.return_value.mainloop.called)
 
-        client_thread = threading.Thread(target=client2.main)
-        client_thread.start()
+    def test_game_over(self):
+        """Test game over scenario."""
+        client2.process_server_message({"type": "game_over", "message": "Player 1 Wins!"})
 
-        self.assertTrue(mock_socket_instance.recv.called)
+        self.assertTrue(client2.game_over)
+        self.show_game_over_popup.assert_called_once_with("Player 1 Wins!")
+        self.assertTrue(self.disable_all_buttons.called)
 
-        client_thread.join()
+    def test_ship_sunk_notification(self):
+        """Test ship sunk notification to the client."""
+        client2.process_server_message({"type": "ship_sunk", "message": "Player 1 has sunk Player 2's Submarine!"})
 
-    @patch('client2.socket.socket')
-    def test_your_turn_notification(self, mock_socket):
-        """Test your turn notification to the client."""
-        mock_socket_instance = mock_socket.return_value
-        mock_socket_instance.recv.return_value = pickle.dumps({"type": "your_turn", "message": "It's your turn to attack!"})
+        self.messagebox.showinfo.assert_called_once_with("Ship Sunk", "Player 1 has sunk Player 2's Submarine!")
 
-        client_thread = threading.Thread(target=client2.main)
-        client_thread.start()
+    def test_wait_turn_notification(self):
+        """Test wait turn notification to the client."""
+        client2.your_turn = True
+        client2.process_server_message({"type": "wait_turn", "message": "Waiting for your opponent's turn."})
 
-        self.assertTrue(mock_socket_instance.recv.called)
+        self.assertFalse(client2.your_turn)
+        self.update_notification.assert_called_once_with("Waiting for your opponent's turn.")
 
-        client_thread.join()
+    def test_your_turn_notification(self):
+        """Test your turn notification to the client."""
+        client2.process_server_message({"type": "your_turn", "message": "It's your turn to attack!"})
+
+        self.assertTrue(client2.your_turn)
+        self.update_notification.assert_called_once_with("It's your turn to attack!")
+
+    @patch.object(client2, 'root')
+    @patch.object(client2, 'client')
+    def test_heartbeat_reply(self, mock_client, mock_root):
+        """Test that the client answers heartbeats itself and forwards other messages to the GUI."""
+        stream = pickle.dumps({"type": "heartbeat"}) + pickle.dumps({"type": "your_turn"})
+        with patch.object(client2, 'server_stream', io.BytesIO(stream)), harness.quiet():
+            client2.receive_data()
+
+        mock_client.send.assert_called_once_with(pickle.dumps({"type": "heartbeat_ack"}))
+        mock_root.after.assert_called_once_with(100, client2.process_server_message, {"type": "your_turn"})
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.deadlines = scheduler.DeadlineScheduler()
+
+    def test_pop_expired_in_deadline_order(self):
+        """Test that expired keys come back earliest first and later ones stay scheduled."""
+        self.deadlines.schedule("b", 2)
+        self.deadlines.schedule("a", 1)
+        self.deadlines.schedule("c", 3)
+
+        self.assertEqual(self.deadlines.pop_expired(2), ["a", "b"])
+        self.assertEqual(len(self.deadlines), 1)
+        self.assertEqual(self.deadlines.next_deadline(), 3)
+
+    def test_reschedule_and_cancel(self):
+        """Test that rescheduled and cancelled keys do not fire at their old deadline."""
+        self.deadlines.schedule("a", 1)
+        self.deadlines.schedule("b", 1)
+        self.deadlines.schedule("a", 5)
+        self.assertTrue(self.deadlines.cancel("b"))
+        self.assertFalse(self.deadlines.cancel("b"))
+
+        self.assertEqual(self.deadlines.next_deadline(), 5)
+        self.assertEqual(self.deadlines.pop_expired(4), [])
+        self.assertEqual(self.deadlines.pop_expired(5), ["a"])
+        self.assertIsNone(self.deadlines.next_deadline())
+
+    def test_rescheduling_keeps_heap_bounded(self):
+        """Test that stale entries are compacted away."""
+        for deadline in range(10000):
+            self.deadlines.schedule("a", deadline)
+
+        self.assertLessEqual(len(self.deadlines._heap), 2 * len(self.deadlines) + 64)
+        self.assertEqual(self.deadlines.pop_expired(10000), ["a"])
+
+    def test_many_deadlines(self):
+        """Test that one scheduler tracks a large number of deadlines."""
+        count = 200000
+        for key in range(count):
+            self.deadlines.schedule(key, (key * 7919) % count)
+
+        self.assertEqual(len(self.deadlines), count)
+        self.assertEqual(len(self.deadlines.pop_expired(count // 2 - 1)), count // 2)
+        self.assertEqual(self.deadlines.next_deadline(), count // 2)
+
+class TestHarness(unittest.TestCase):
+
+    def test_socketpair_game_matches_in_memory_game(self):
+        """Test that games over real sockets play out exactly like the in-memory games."""
+        for seed, result in harness.play_games(20, seed=100, transport=harness.play_socketpair_game):
+            layouts, shots = harness.random_script(random.Random(seed))
+            expected = harness.play_game(layouts, shots, seed)
+            self.assertEqual((result["winner"], result["first"], result["attacks"]),
+                             (expected["winner"], expected["first"], expected["attacks"]))
+            for messages in result["messages"]:
+                self.assertEqual(messages[-1]["type"], "game_over")
+
+    def test_seed_selects_first_player(self):
+        """Test that seeding random makes the server's choice of first player repeatable."""
+        layouts, shots = harness.random_script(random.Random(0))
+        firsts = {seed: harness.play_game(layouts, shots, seed)["first"] for seed in range(10)}
+
+        self.assertEqual(firsts, {seed: harness.play_game(layouts, shots, seed)["first"] for seed in range(10)})
+        self.assertEqual(set(firsts.values()), {0, 1})
+
+    def test_scripted_games_benchmark(self):
+        """Play many full scripted games and report the throughput."""
+        start = time.perf_counter()
+        wins = [0, 0]
+        for seed, result in harness.play_games(BENCHMARK_GAMES):
+            self.assertGreaterEqual(result["attacks"], 2 * sum(server2.ships.values()) - 1)
+            wins[result["winner"] == result["first"]] += 1
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(sum(wins), BENCHMARK_GAMES)
+        print(f"\n{BENCHMARK_GAMES} scripted games in {elapsed:.2f}s ({BENCHMARK_GAMES / elapsed:.0f} games/s)")
+
+class TestTournament(unittest.TestCase):
+
+    def test_play_match_is_deterministic(self):
+        """Test that a match replays identically from its seed."""
+        self.assertEqual(tournament.play_match("random", "hunt_target", 7),
+                         tournament.play_match("random", "hunt_target", 7))
+
+    def test_play_match_sinks_every_ship(self):
+        """Test that a match only ends once one side has sunk every ship cell."""
+        winner, first, shots = tournament.play_match("parity", "parity", 3)
+        self.assertIn(winner, (0, 1))
+        self.assertIn(first, (0, 1))
+        self.assertGreaterEqual(shots, 2 * sum(server2.ships.values()) - 1)
+        self.assertLessEqual(shots, 2 * server2.map_size * server2.map_size)
+
+    def test_random_layout_places_all_ships(self):
+        """Test that a random layout places every ship without overlaps."""
+        board, layout = tournament.random_layout(random.Random(1))
+        self.assertEqual(set(layout), set(server2.ships))
+        cells = [cell for row in board for cell in row if cell != "_"]
+        self.assertEqual(len(cells), sum(server2.ships.values()))
+
+    def test_run_tournament(self):
+        """Test that a tournament streams every game to CSV and aggregates win rates."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.csv")
+            games = tournament.run_tournament(path, games_per_pair=30, chunk_size=7, workers=2)
+            self.assertEqual(games, 90)
+            summary = tournament.summarize(path)
+
+        self.assertEqual(len(summary["pairs"]), 3)
+        for name, stats in summary["strategies"].items():
+            self.assertEqual(stats["games"], 60)
+            self.assertLessEqual(stats["ci_low"], stats["win_rate"])
+            self.assertLessEqual(stats["win_rate"], stats["ci_high"])
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+    def record_games(self, path, count, seed=0):
+        """Play scripted games through the server with replay recording on."""
+        with patch.object(server2, 'REPLAY_PATH', path):
+            return [(game_seed, result) for game_seed, result in harness.play_games(count, seed)]
+
+    def test_round_trip(self):
+        """Test that a game written to a replay file reads back unchanged."""
+        path = os.path.join(self.tmp, "games.bsr")
+        shots = [(0, 0, True), (9, 9, False), (4, 7, False)]
+        replay.append_game(path, [LAYOUT, LAYOUT], 1, 0, shots)
+        replay.append_game(path, [LAYOUT, LAYOUT], 0, 1, [])
+
+        games = list(replay.iter_replays(path))
+        self.assertEqual(games[0], replay.Replay([LAYOUT, LAYOUT], 1, 0, shots))
+        self.assertEqual(games[1], replay.Replay([LAYOUT, LAYOUT], 0, 1, []))
+        self.assertEqual(os.path.getsize(path), len(replay.HEADER) + 2 * (3 + 10) + len(shots))
+
+    def test_truncated_file(self):
+        """Test that a cut-off record is reported instead of silently dropped."""
+        path = os.path.join(self.tmp, "games.bsr")
+        replay.append_game(path, [LAYOUT, LAYOUT], 0, 0, [(0, 0, True)])
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) - 1)
+
+        with self.assertRaises(ValueError):
+            list(replay.iter_replays(path))
+
+    def test_server_records_finished_matches(self):
+        """Test that the server appends a replay of every finished match."""
+        path = os.path.join(self.tmp, "games.bsr")
+        results = self.record_games(path, 30)
+
+        games = list(replay.iter_replays(path))
+        self.assertEqual(len(games), 30)
+        for (seed, result), game in zip(results, games):
+            layouts, shots = harness.random_script(random.Random(seed))
+            self.assertEqual(game.layouts, layouts)
+            self.assertEqual((game.first, game.winner), (result["first"], result["winner"]))
+            self.assertEqual(len(game.shots), result["attacks"])
+            winner_shots = game.shots[0::2] if game.winner == game.first else game.shots[1::2]  # First mover fires first
+            self.assertEqual(sum(hit for _, _, hit in winner_shots), sum(server2.ships.values()))
+
+    def test_analyze(self):
+        """Test aggregate statistics over a corpus split across files."""
+        paths = [os.path.join(self.tmp, f"games{i}.bsr") for i in range(3)]
+        results = []
+        for i, path in enumerate(paths):
+            results += self.record_games(path, 40, seed=i * 40)
+
+        analysis = analyzer.analyze(paths)
+        self.assertEqual(analyzer.analyze(paths, workers=2), analysis)
+
+        self.assertEqual(analysis["games"], 120)
+        first_mover_wins = sum(result["winner"] == result["first"] for _, result in results)
+        self.assertAlmostEqual(analysis["first_mover_win_rate"], first_mover_wins / 120)
+        self.assertAlmostEqual(analysis["avg_shots"], sum(result["attacks"] for _, result in results) / 120)
+        low, high = analysis["first_mover_ci"]
+        self.assertTrue(low <= analysis["first_mover_win_rate"] <= high)
+        for ship_name, length in server2.ships.items():
+            self.assertGreaterEqual(analysis["avg_shots_to_sink"][ship_name], length)
+        for row in analysis["hit_rate"]:
+            for rate in row:
+                self.assertTrue(rate is None or 0 <= rate <= 1)
+
+    def test_reaped_match_is_recorded(self):
+        """Test that a match ended by a timeout is recorded as forfeited and skipped by default."""
+        path = os.path.join(self.tmp, "games.bsr")
+        self.record_games(path, 3)
+        server2.reset_game()
+        conns = [harness.MemoryConnection(), harness.MemoryConnection()]
+        server2.clients.extend(conns)
+        with patch.object(server2, 'REPLAY_PATH', path), harness.quiet():
+            for player_id in range(2):
+                for message in harness.placement_messages(LAYOUT):
+                    server2.handle_message(conns[player_id], player_id, message)
+            first = server2.turn
+            server2.handle_message(conns[first], first, {"type": "attack", "coords": (0, 0)})
+            server2.reap_expired(time.monotonic() + server2.TURN_TIMEOUT + 1)  # The second player never attacks
+
+        games = list(replay.iter_replays(path))
+        self.assertEqual(len(games), 4)
+        self.assertEqual(games[-1], replay.Replay([LAYOUT, LAYOUT], first, first, [(0, 0, True)], forfeited=True))
+        self.assertFalse(any(game.forfeited for game in games[:-1]))
+
+        analysis = analyzer.analyze([path])
+        self.assertEqual((analysis["games"], analysis["forfeits"]), (3, 1))
+        analysis = analyzer.analyze([path], include_forfeits=True)
+        self.assertEqual((analysis["games"], analysis["forfeits"]), (4, 1))
+
+    def test_match_abandoned_during_placement_is_not_recorded(self):
+        """Test that a forfeit before combat leaves nothing to replay."""
+        path = os.path.join(self.tmp, "games.bsr")
+        server2.reset_game()
+        server2.clients.extend([harness.MemoryConnection(), harness.MemoryConnection()])
+        with patch.object(server2, 'REPLAY_PATH', path), harness.quiet():
+            server2.forfeit(0, "Player 1 left the game.")
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_analyzer_does_not_import_server(self):
+        """Test that the analyzer, and so each of its workers, does not build the server's game state."""
+        result = subprocess.run([sys.executable, "-c", "import sys, analyzer; print('server2' in sys.modules)"],
+                                cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "False")
+
+    def test_analyzer_memory_is_bounded(self):
+        """Test that analyzing a file does not hold its games in memory."""
+        path = os.path.join(self.tmp, "games.bsr")
+        self.record_games(path, 1)
+        with open(path, "rb") as f:
+            record = f.read()[len(replay.HEADER):]
+        with open(path, "ab") as f:
+            f.write(record * 1999)
+
+        tracemalloc.start()
+        try:
+            totals = analyzer.analyze_file(path)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(totals["games"], 2000)
+        self.assertLess(peak, 256 * 1024)  # The file itself is around 400 KB
 
 if __name__ == '__main__':
     unittest.main()
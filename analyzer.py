@@ -0,0 +1,149 @@
+# analyzer.py
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+from replay import iter_records, map_size, ships, HIT, FORFEITED
+from stats import wilson_interval
+
+# Streaming statistics over replay files. Records are read one at a time and
+# folded into fixed-size counters, so memory does not grow with the corpus.
+
+ship_names = list(ships)
+ship_lengths = list(ships.values())
+cell_count = map_size * map_size
+
+def new_totals():
+    """Return empty counters for analyze_file()."""
+    return {
+        "games": 0,
+        "forfeits": 0,  # Forfeited games seen, whether or not they were included
+        "first_mover_wins": 0,
+        "shots": 0,
+        "cell_shots": [0] * cell_count,
+        "cell_hits": [0] * cell_count,
+        "sink_shots": [0] * len(ships),  # Attacker's shots fired until each ship type sank, summed
+        "sinks": [0] * len(ships),
+    }
+
+def merge_totals(totals, other):
+    """Add the counters in other to totals."""
+    for key, value in other.items():
+        if isinstance(value, list):
+            totals[key] = [a + b for a, b in zip(totals[key], value)]
+        else:
+            totals[key] += value
+    return totals
+
+def ship_owners(placements):
+    """Map each cell of one player's board to the index of the ship on it (-1 for water)."""
+    owners = [-1] * cell_count
+    for ship_index, value in enumerate(placements):
+        cell, vertical = divmod(value, 2)
+        step = map_size if vertical else 1
+        for i in range(ship_lengths[ship_index]):
+            owners[cell + i * step] = ship_index
+    return owners
+
+def analyze_file(path, include_forfeits=False):
+    """Fold every game in one replay file into a fresh set of counters.
+
+    Forfeited games are counted but left out of the statistics unless
+    include_forfeits is set.
+    """
+    totals = new_totals()
+    cell_shots, cell_hits = totals["cell_shots"], totals["cell_hits"]
+    sink_shots, sinks = totals["sink_shots"], totals["sinks"]
+    games = forfeits = first_mover_wins = shot_total = 0
+
+    for flags, placements, shots in iter_records(path):
+        if flags & FORFEITED:
+            forfeits += 1
+            if not include_forfeits:
+                continue
+        first = flags & 1
+        games += 1
+        first_mover_wins += first == flags >> 1 & 1
+        shot_total += len(shots)
+
+        # Players alternate, so each attacker's shots are every other byte
+        for attacker, attacker_shots in ((first, shots[0::2]), (1 - first, shots[1::2])):
+            defender = 1 - attacker
+            owners = ship_owners(placements[defender * len(ships):(defender + 1) * len(ships)])
+            remaining = ship_lengths[:]
+            for fired, shot in enumerate(attacker_shots, 1):
+                cell = shot & ~HIT
+                cell_shots[cell] += 1
+                if shot & HIT:
+                    cell_hits[cell] += 1
+                    ship_index = owners[cell]
+                    remaining[ship_index] -= 1
+                    if not remaining[ship_index]:
+                        sink_shots[ship_index] += fired
+                        sinks[ship_index] += 1
+
+    totals["games"], totals["forfeits"] = games, forfeits
+    totals["first_mover_wins"], totals["shots"] = first_mover_wins, shot_total
+    return totals
+
+def analyze(paths, workers=1, include_forfeits=False):
+    """Aggregate statistics over many replay files.
+
+    With workers > 1 the files are spread across a process pool, one file per task.
+    games counts only the games analyzed; forfeits counts every forfeited game seen.
+    Returns {"games", "forfeits", "avg_shots", "first_mover_win_rate", "first_mover_ci",
+    "hit_rate" (a map_size x map_size grid, None for cells never shot at),
+    "avg_shots_to_sink" ({ship: shots or None})}.
+    """
+    totals = new_totals()
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for file_totals in executor.map(analyze_file, paths, itertools.repeat(include_forfeits)):
+                merge_totals(totals, file_totals)
+    else:
+        for path in paths:
+            merge_totals(totals, analyze_file(path, include_forfeits))
+
+    games = totals["games"]
+    hit_rate = [[totals["cell_hits"][row * map_size + col] / totals["cell_shots"][row * map_size + col]
+                 if totals["cell_shots"][row * map_size + col] else None
+                 for col in range(map_size)] for row in range(map_size)]
+    return {
+        "games": games,
+        "forfeits": totals["forfeits"],
+        "avg_shots": totals["shots"] / games if games else 0.0,
+        "first_mover_win_rate": totals["first_mover_wins"] / games if games else 0.0,
+        "first_mover_ci": wilson_interval(totals["first_mover_wins"], games),
+        "hit_rate": hit_rate,
+        "avg_shots_to_sink": {ship_name: totals["sink_shots"][i] / totals["sinks"][i] if totals["sinks"][i] else None
+                              for i, ship_name in enumerate(ship_names)},
+    }
+
+def print_analysis(analysis):
+    """Print the statistics returned by analyze()."""
+    low, high = analysis["first_mover_ci"]
+    print(f"Games: {analysis['games']} (forfeited games seen: {analysis['forfeits']})")
+    print(f"Average shots per game: {analysis['avg_shots']:.1f}")
+    print(f"First mover win rate: {analysis['first_mover_win_rate']:.3f} (95% CI {low:.3f}-{high:.3f})")
+    print()
+    print("Average shots to sink:")
+    for ship_name, shots in analysis["avg_shots_to_sink"].items():
+        print(f"  {ship_name:<11} {'-' if shots is None else f'{shots:.1f}'}")
+    print()
+    print("Hit rate per cell:")
+    print("    " + " ".join(f"{col:>4}" for col in range(map_size)))
+    for row, rates in enumerate(analysis["hit_rate"]):
+        print(f"{row:>3} " + " ".join("   -" if rate is None else f"{rate:4.2f}" for rate in rates))
+
+def main():
+    """Analyze replay files from the command line."""
+    parser = argparse.ArgumentParser(description="Aggregate statistics over Battleship replay files.")
+    parser.add_argument("paths", nargs="+", help="replay files to analyze")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes, one file per task")
+    parser.add_argument("--include-forfeits", action="store_true", help="include games that ended by forfeit")
+    args = parser.parse_args()
+
+    print_analysis(analyze(args.paths, args.workers, args.include_forfeits))
+
+if __name__ == "__main__":
+    main()
@@ -4,18 +4,18 @@ import pickle
 import tkinter as tk
 import tkinter.font as tkFont
 from tkinter import messagebox
+import threading
 from queue import Queue
 from threading import Lock
 
 # Client setup
 HOST = 'localhost'
 PORT = 9999
-client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-client.connect((HOST, PORT))
+client = None  # Connected in main()
+server_stream = None  # Buffered reader over client, so messages that arrive together are all decoded
+player_id = None  # Assigned by the server's "start" message
 
-# Receive player ID and initialize board
-initial_data = pickle.loads(client.recv(4096))  # Increased buffer size
-player_id = initial_data["player_id"]
+# Initialize board
 map_size = 10
 player_board = [["_" for _ in range(map_size)] for _ in range(map_size)]
 attack_board = [["_" for _ in range(map_size)] for _ in range(map_size)]
@@ -31,40 +31,6 @@ game_over = False
 # GUI variables
 ship_buttons = {}
 
-# Tkinter setup for GUI
-root = tk.Tk()
-root.title(f"Battleship - Player {player_id + 1}")
-root.geometry("800x600")
-root.configure(bg="#2c3e50")
-
-# Define styles for buttons and labels
-button_font = tkFont.Font(family="Helvetica", size=10, weight="bold")
-board_button_style = {"width": 2, "height": 1, "font": button_font, "bg": "#ecf0f1", "fg": "#2c3e50"}
-hit_button_style = {"width": 2, "height": 1, "font": button_font, "bg": "#e74c3c", "fg": "#ecf0f1"}  # Red background for hits
-miss_button_style = {"width": 2, "height": 1, "font": button_font, "bg": "#95a5a6", "fg": "#ecf0f1"}  # Gray background for misses
-ship_button_style = {"font": button_font, "bg": "#3498db", "fg": "#ecf0f1", "activebackground": "#2980b9", "activeforeground": "#ecf0f1"}
-
-# Frame setup for player board and attack board
-player_frame = tk.Frame(root, bg="#2c3e50")
-player_frame.grid(row=0, column=0, padx=10, pady=10)
-border_frame = tk.Frame(root, width=10, bg="#2c3e50")  # Divider
-border_frame.grid(row=0, column=1, sticky="ns")
-attack_frame = tk.Frame(root, bg="#2c3e50")
-attack_frame.grid(row=0, column=2, padx=10, pady=10)
-
-# Notification label
-notification_label = tk.Label(root, text="", bg="#2c3e50", fg="#ecf0f1", font=button_font)
-notification_label.grid(row=2, column=0, columnspan=3, pady=10)
-
-# Create button grids for player and attack boards
-player_buttons = [[tk.Button(player_frame, **board_button_style) for _ in range(map_size)] for _ in range(map_size)]
-attack_buttons = [[tk.Button(attack_frame, **board_button_style) for _ in range(map_size)] for _ in range(map_size)]
-
-for row in range(map_size):
-    for col in range(map_size):
-        player_buttons[row][col].grid(row=row, column=col, padx=1, pady=1)
-        attack_buttons[row][col].grid(row=row, column=col, padx=1, pady=1)
-
 # Functions to handle ship placement and attacks
 def select_ship(ship_name):
     """Set the ship that the player wants to place."""
@@ -194,8 +160,13 @@ def receive_data():
     global phase, your_turn
     while True:
         try:
-            data = pickle.loads(client.recv(4096))  # Increased buffer size
+            data = pickle.load(server_stream)
             print(f"Player {player_id + 1} received: {data}")  # Debugging log
+
+            # Answer heartbeats straight away so a busy GUI does not look idle to the server
+            if isinstance(data, dict) and data["type"] == "heartbeat":
+                client.send(pickle.dumps({"type": "heartbeat_ack"}))
+                continue
             
             # Use root.after to handle GUI updates in the main thread
             root.after(100, process_server_message, data)
@@ -286,25 +257,6 @@ def place_ship_on_board(symbol, row, col, orientation):
         for i in range(length):
             player_board[row + i][col] = symbol
 
-# Buttons for selecting ships and toggling orientation
-ship_selection_frame = tk.Frame(root, bg="#2c3e50")
-ship_selection_frame.grid(row=1, column=0, columnspan=3, pady=10)
-tk.Label(ship_selection_frame, text="Select a Ship to Place:", bg="#2c3e50", fg="#ecf0f1", font=button_font).pack()
-
-for ship_name in ships.keys():
-    btn = tk.Button(ship_selection_frame, text=ship_name, command=lambda s=ship_name: select_ship(s), **ship_button_style)
-    btn.pack(side=tk.LEFT, padx=5)
-    ship_buttons[ship_name] = btn
-
-tk.Button(ship_selection_frame, text="Toggle Orientation", command=toggle_orientation, **ship_button_style).pack(side=tk.LEFT, padx=5)
-
-# Start receiving data from the server
-import threading
-threading.Thread(target=receive_data, daemon=True).start()
-
-update_boards()
-root.mainloop()
-
 def disable_all_buttons():
     """Disable all buttons on both boards after game over."""
     for widget in player_frame.winfo_children():
@@ -312,4 +264,74 @@ def disable_all_buttons():
             widget.config(state=tk.DISABLED)
     for widget in attack_frame.winfo_children():
         if isinstance(widget, tk.Button):
-            widget.config(state=tk.DISABLED)
\ No newline at end of file
+            widget.config(state=tk.DISABLED)
+
+def main():
+    """Connect to the server, build the GUI and run it."""
+    global client, server_stream, player_id, root, button_font
+    global board_button_style, hit_button_style, miss_button_style, ship_button_style
+    global player_frame, attack_frame, notification_label, player_buttons, attack_buttons
+
+    # Client setup
+    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client.connect((HOST, PORT))
+    server_stream = client.makefile("rb")
+
+    # Receive player ID
+    initial_data = pickle.load(server_stream)
+    player_id = initial_data["player_id"]
+
+    # Tkinter setup for GUI
+    root = tk.Tk()
+    root.title(f"Battleship - Player {player_id + 1}")
+    root.geometry("800x600")
+    root.configure(bg="#2c3e50")
+
+    # Define styles for buttons and labels
+    button_font = tkFont.Font(family="Helvetica", size=10, weight="bold")
+    board_button_style = {"width": 2, "height": 1, "font": button_font, "bg": "#ecf0f1", "fg": "#2c3e50"}
+    hit_button_style = {"width": 2, "height": 1, "font": button_font, "bg": "#e74c3c", "fg": "#ecf0f1"}  # Red background for hits
+    miss_button_style = {"width": 2, "height": 1, "font": button_font, "bg": "#95a5a6", "fg": "#ecf0f1"}  # Gray background for misses
+    ship_button_style = {"font": button_font, "bg": "#3498db", "fg": "#ecf0f1", "activebackground": "#2980b9", "activeforeground": "#ecf0f1"}
+
+    # Frame setup for player board and attack board
+    player_frame = tk.Frame(root, bg="#2c3e50")
+    player_frame.grid(row=0, column=0, padx=10, pady=10)
+    border_frame = tk.Frame(root, width=10, bg="#2c3e50")  # Divider
+    border_frame.grid(row=0, column=1, sticky="ns")
+    attack_frame = tk.Frame(root, bg="#2c3e50")
+    attack_frame.grid(row=0, column=2, padx=10, pady=10)
+
+    # Notification label
+    notification_label = tk.Label(root, text="", bg="#2c3e50", fg="#ecf0f1", font=button_font)
+    notification_label.grid(row=2, column=0, columnspan=3, pady=10)
+
+    # Create button grids for player and attack boards
+    player_buttons = [[tk.Button(player_frame, **board_button_style) for _ in range(map_size)] for _ in range(map_size)]
+    attack_buttons = [[tk.Button(attack_frame, **board_button_style) for _ in range(map_size)] for _ in range(map_size)]
+
+    for row in range(map_size):
+        for col in range(map_size):
+            player_buttons[row][col].grid(row=row, column=col, padx=1, pady=1)
+            attack_buttons[row][col].grid(row=row, column=col, padx=1, pady=1)
+
+    # Buttons for selecting ships and toggling orientation
+    ship_selection_frame = tk.Frame(root, bg="#2c3e50")
+    ship_selection_frame.grid(row=1, column=0, columnspan=3, pady=10)
+    tk.Label(ship_selection_frame, text="Select a Ship to Place:", bg="#2c3e50", fg="#ecf0f1", font=button_font).pack()
+
+    for ship_name in ships.keys():
+        btn = tk.Button(ship_selection_frame, text=ship_name, command=lambda s=ship_name: select_ship(s), **ship_button_style)
+        btn.pack(side=tk.LEFT, padx=5)
+        ship_buttons[ship_name] = btn
+
+    tk.Button(ship_selection_frame, text="Toggle Orientation", command=toggle_orientation, **ship_button_style).pack(side=tk.LEFT, padx=5)
+
+    # Start receiving data from the server
+    threading.Thread(target=receive_data, daemon=True).start()
+
+    update_boards()
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# harness.py
+import contextlib
+import pickle
+import random
+import socket
+import threading
+
+import server2
+from tournament import random_layout
+
+# Harness for playing scripted games against the server without a listening port.
+# A script is a ship layout per player ({ship: (row, col, orientation)}) and a
+# list of (row, col) shots per player, fired in order whenever it is that player's turn.
+
+class MemoryConnection:
+    """In-memory stand-in for a client socket that records every message the server sends."""
+
+    def __init__(self):
+        self.sent = []  # Raw pickles, decoded only when messages is read
+        self.closed = False
+
+    @property
+    def messages(self):
+        """Every message sent so far, decoded."""
+        return [pickle.loads(data) for data in self.sent]
+
+    def send(self, data, flags=0):
+        self.sent.append(data)
+        return len(data)
+
+    def shutdown(self, how):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+def quiet():
+    """Silence the server's debug prints (print() is a no-op while sys.stdout is None)."""
+    return contextlib.redirect_stdout(None)
+
+def random_script(rng):
+    """Build a random valid script: (layouts, shots) for both players."""
+    cells = [(row, col) for row in range(server2.map_size) for col in range(server2.map_size)]
+    layouts = [random_layout(rng)[1], random_layout(rng)[1]]
+    shots = [rng.sample(cells, len(cells)), rng.sample(cells, len(cells))]
+    return layouts, shots
+
+def placement_messages(layout):
+    """Turn a layout into the place_ship messages a client would send."""
+    return [{"type": "place_ship", "ship": ship_name, "coords": (row, col), "orientation": orientation}
+            for ship_name, (row, col, orientation) in layout.items()]
+
+def play_game(layouts, shots, seed):
+    """Play a scripted game through the server's message handlers, in memory.
+
+    random is seeded before the game so the server picks the same first player
+    every time. Returns {"winner", "first", "attacks", "connections"}, where
+    connections holds the MemoryConnection of each player.
+    """
+    server2.reset_game()
+    random.seed(seed)
+    conns = [MemoryConnection(), MemoryConnection()]
+    server2.clients.extend(conns)
+
+    with quiet():
+        for player_id in range(2):
+            for message in placement_messages(layouts[player_id]):
+                server2.handle_message(conns[player_id], player_id, message)
+
+        first = server2.turn
+        remaining = [iter(shots[0]), iter(shots[1])]
+        attacks = 0
+        while server2.phase == "combat":
+            player_id = server2.turn
+            message = {"type": "attack", "coords": next(remaining[player_id])}
+            server2.handle_message(conns[player_id], player_id, message)
+            attacks += 1
+            if server2.ships_sunk[1 - player_id] == len(server2.ships):
+                return {"winner": player_id, "first": first, "attacks": attacks, "connections": conns}
+    raise RuntimeError("Game did not reach combat")
+
+def play_socketpair_game(layouts, shots, seed):
+    """Play a scripted game over socket.socketpair() through handle_client.
+
+    Each player's server side runs handle_client in its own thread, exactly as
+    it would behind server.accept(). Returns {"winner", "first", "attacks",
+    "messages"}, where messages holds everything the server sent to each player.
+    """
+    server2.reset_game()
+    random.seed(seed)
+    pairs = [socket.socketpair(), socket.socketpair()]
+    server2.clients.extend(server_end for server_end, _ in pairs)
+    clients = [client_end for _, client_end in pairs]
+    readers = [client_end.makefile("rb") for client_end in clients]  # The stream may hold several pickles
+    messages = [[], []]
+
+    def receive(player_id, *types):
+        """Read messages for a player until one of the given types arrives."""
+        while True:
+            message = pickle.load(readers[player_id])
+            messages[player_id].append(message)
+            if message["type"] == "error":
+                raise RuntimeError(f"Player {player_id + 1}: {message['message']}")
+            if message["type"] in types:
+                return message
+
+    with quiet():
+        threads = [threading.Thread(target=server2.handle_client, args=(server_end, player_id))
+                   for player_id, (server_end, _) in enumerate(pairs)]
+        for thread in threads:
+            thread.start()
+        try:
+            for player_id in range(2):
+                receive(player_id, "start")
+                for message in placement_messages(layouts[player_id]):
+                    clients[player_id].sendall(pickle.dumps(message))
+                    receive(player_id, "ship_placed")
+                receive(player_id, "all_ships_placed")
+                if player_id == 0:
+                    receive(player_id, "wait_turn")  # Sent while the opponent is still placing
+
+            turn_messages = [receive(player_id, "your_turn", "wait_turn") for player_id in range(2)]
+            player_id = first = [m["type"] for m in turn_messages].index("your_turn")
+            remaining = [iter(shots[0]), iter(shots[1])]
+            attacks = 0
+            while True:
+                opponent_id = 1 - player_id
+                clients[player_id].sendall(pickle.dumps({"type": "attack", "coords": next(remaining[player_id])}))
+                attacks += 1
+                receive(player_id, "attack_result")
+                if receive(player_id, "wait_turn", "game_over")["type"] == "game_over":
+                    receive(opponent_id, "game_over")
+                    return {"winner": player_id, "first": first, "attacks": attacks, "messages": messages}
+                receive(opponent_id, "your_turn")
+                player_id = opponent_id
+        finally:
+            for reader, client_end in zip(readers, clients):
+                reader.close()
+                client_end.close()  # handle_client sees the disconnect and exits
+            for thread in threads:
+                thread.join()
+
+def play_games(count, seed=0, transport=play_game):
+    """Play count random scripted games and yield each result with its seed."""
+    for game_seed in range(seed, seed + count):
+        layouts, shots = random_script(random.Random(game_seed))
+        yield game_seed, transport(layouts, shots, game_seed)
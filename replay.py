@@ -0,0 +1,75 @@
+# replay.py
+import struct
+from collections import namedtuple
+
+# Replay file format
+# A file starts with HEADER and holds any number of game records, appended as games finish:
+#   flags (1 byte)      bit 0: player who attacked first, bit 1: winner,
+#                       bit 2: set if the match ended by forfeit rather than by sinking every ship
+#   shot count (2 bytes, little-endian)
+#   placements (10 bytes) each player's ships in the order of `ships`, one byte each:
+#                       (row * map_size + col) * 2 + (1 if vertical else 0)
+#   shots (1 byte each) cell index (row * map_size + col), high bit set on a hit.
+#                       Players alternate, starting with the first attacker.
+# The ship order and sizes are part of the format, so they are fixed here rather
+# than taken from the server.
+HEADER = b"BSRP\x01"
+RECORD_HEADER = struct.Struct("<BH")
+map_size = 10
+ships = {"Carrier": 5, "Battleship": 4, "Cruiser": 3, "Submarine": 2, "Destroyer": 2}
+PLACEMENT_SIZE = 2 * len(ships)
+HIT = 0x80
+FORFEITED = 0x04  # Flags bit
+READ_BUFFER = 1 << 16
+
+Replay = namedtuple("Replay", ["layouts", "first", "winner", "shots", "forfeited"], defaults=[False])
+# layouts: [{ship: (row, col, orientation)}, ...] for both players
+# shots: [(row, col, hit), ...] in the order they were fired
+
+def encode_game(layouts, first, winner, shots, forfeited=False):
+    """Pack one finished game into a replay record."""
+    placements = bytes((layout[ship_name][0] * map_size + layout[ship_name][1]) * 2 + (layout[ship_name][2] == "V")
+                       for layout in layouts for ship_name in ships)
+    shot_bytes = bytes((row * map_size + col) | (HIT if hit else 0) for row, col, hit in shots)
+    flags = first | winner << 1 | (FORFEITED if forfeited else 0)
+    return RECORD_HEADER.pack(flags, len(shot_bytes)) + placements + shot_bytes
+
+def append_game(path, layouts, first, winner, shots, forfeited=False):
+    """Append one finished game to a replay file, creating the file if needed."""
+    record = encode_game(layouts, first, winner, shots, forfeited)
+    with open(path, "ab") as f:
+        if f.tell() == 0:
+            f.write(HEADER)
+        f.write(record)
+
+def iter_records(path):
+    """Yield (flags, placements, shots) as raw bytes for each game, reading one record at a time."""
+    with open(path, "rb", buffering=READ_BUFFER) as f:
+        if f.read(len(HEADER)) != HEADER:
+            raise ValueError(f"{path} is not a replay file")
+        while True:
+            record_header = f.read(RECORD_HEADER.size)
+            if not record_header:
+                return
+            if len(record_header) < RECORD_HEADER.size:
+                raise ValueError(f"{path} ends with a truncated record")
+            flags, shot_count = RECORD_HEADER.unpack(record_header)
+            body = f.read(PLACEMENT_SIZE + shot_count)
+            if len(body) < PLACEMENT_SIZE + shot_count:
+                raise ValueError(f"{path} ends with a truncated record")
+            yield flags, body[:PLACEMENT_SIZE], body[PLACEMENT_SIZE:]
+
+def decode_placements(placements):
+    """Turn one player's placement bytes back into {ship: (row, col, orientation)}."""
+    layout = {}
+    for ship_name, value in zip(ships, placements):
+        cell, vertical = divmod(value, 2)
+        layout[ship_name] = (*divmod(cell, map_size), "V" if vertical else "H")
+    return layout
+
+def iter_replays(path):
+    """Yield each game in a replay file as a Replay."""
+    for flags, placements, shots in iter_records(path):
+        layouts = [decode_placements(placements[:len(ships)]), decode_placements(placements[len(ships):])]
+        decoded_shots = [(*divmod(shot & ~HIT, map_size), bool(shot & HIT)) for shot in shots]
+        yield Replay(layouts, flags & 1, flags >> 1 & 1, decoded_shots, bool(flags & FORFEITED))
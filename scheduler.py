@@ -0,0 +1,80 @@
+# scheduler.py
+import heapq
+import itertools
+import threading
+
+class DeadlineScheduler:
+    """Tracks a deadline per key in one heap, so a single loop can watch any number of keys.
+
+    Rescheduling or cancelling a key does not search the heap: the old entry is
+    left in place and skipped when it reaches the top. The heap is rebuilt once
+    stale entries outnumber live ones, so memory stays proportional to the
+    number of keys.
+    """
+
+    def __init__(self):
+        self._heap = []  # (deadline, sequence, key)
+        self._entries = {}  # key -> (deadline, sequence) of its live heap entry
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def schedule(self, key, deadline):
+        """Set the deadline for a key, replacing any earlier deadline it had."""
+        with self._lock:
+            sequence = next(self._sequence)
+            self._entries[key] = (deadline, sequence)
+            heapq.heappush(self._heap, (deadline, sequence, key))
+            if len(self._heap) > 2 * len(self._entries) + 64:
+                self._compact()
+
+    def cancel(self, key):
+        """Forget a key's deadline. Returns True if it had one."""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        """Forget every deadline."""
+        with self._lock:
+            self._heap.clear()
+            self._entries.clear()
+
+    def deadline(self, key):
+        """Return a key's deadline, or None if it has none."""
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def next_deadline(self):
+        """Return the earliest live deadline, or None if nothing is scheduled."""
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now):
+        """Remove and return the keys whose deadline is at or before now, earliest first."""
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, sequence, key = heapq.heappop(self._heap)
+                if self._entries.get(key) == (deadline, sequence):
+                    del self._entries[key]
+                    expired.append(key)
+        return expired
+
+    def _drop_stale(self):
+        """Pop entries for rescheduled or cancelled keys off the top of the heap."""
+        while self._heap:
+            deadline, sequence, key = self._heap[0]
+            if self._entries.get(key) == (deadline, sequence):
+                return
+            heapq.heappop(self._heap)
+
+    def _compact(self):
+        """Rebuild the heap from the live entries only."""
+        self._heap = [(deadline, sequence, key) for key, (deadline, sequence) in self._entries.items()]
+        heapq.heapify(self._heap)
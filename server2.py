@@ -3,67 +3,182 @@ import socket
 import threading
 import pickle
 import random
+import time
 import traceback
 
+import replay
+from scheduler import DeadlineScheduler
+
 # Server configuration
 HOST = 'localhost'
 PORT = 9999
 map_size = 10
 ships = {"Carrier": 5, "Battleship": 4, "Cruiser": 3, "Submarine": 2, "Destroyer": 2}
 ship_symbols = {"Carrier": "C", "Battleship": "B", "Cruiser": "R", "Submarine": "S", "Destroyer": "D"}
+HEARTBEAT_INTERVAL = 5  # Seconds between heartbeats sent to each client
+IDLE_TIMEOUT = 20  # Seconds without any message (heartbeat replies included) before a client forfeits
+TURN_TIMEOUT = 60  # Seconds a player has to attack before forfeiting
+REPLAY_PATH = None  # Append every match that reaches combat to this replay file (see replay.py)
 
 # Initialize player data
 player_boards = [None, None]  # Boards for player 1 and player 2
 attack_boards = [None, None]  # Boards to track hits/misses
 ship_placements = [set(), set()]  # Track placed ships for each player
 turn = None  # Track whose turn it is
-phase = "placement"  # Game phase: "placement" or "combat"
+phase = "placement"  # Game phase: "placement", "combat" or "over"
 ships_sunk = [0, 0]  # Track number of sunk ships for each player
-
-# Set up server socket
-server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-server.bind((HOST, PORT))
-server.listen(2)
-print("Server started. Waiting for connections...")
+match_log = {"layouts": [{}, {}], "first": None, "shots": []}  # Everything a replay needs
 
 clients = []
+game_lock = threading.RLock()  # Serializes client handlers and the reaper
+deadlines = DeadlineScheduler()  # Heartbeat, idle and turn deadlines keyed by (kind, player_id)
+matches_reaped = 0  # Matches ended by a timeout or a disconnect
+
+def reset_game():
+    """Reset all game state so a new match can be played."""
+    global turn, phase
+
+    for i in range(2):
+        player_boards[i] = [["_" for _ in range(map_size)] for _ in range(map_size)]
+        attack_boards[i] = [["_" for _ in range(map_size)] for _ in range(map_size)]
+        ship_placements[i].clear()
+        ships_sunk[i] = 0
+    turn = None
+    phase = "placement"
+    clients.clear()
+    deadlines.clear()
+    match_log.update(layouts=[{}, {}], first=None, shots=[])
 
 def handle_client(conn, player_id):
     """Handles communication with a single client."""
-    global phase, turn
-
     try:
-        print(f"Handling Player {player_id + 1}.")
-        conn.send(pickle.dumps({"type": "start", "player_id": player_id}))
-
-        while True:
-            try:
+        try:
+            print(f"Handling Player {player_id + 1}.")
+            conn.send(pickle.dumps({"type": "start", "player_id": player_id}))
+            reader = conn.makefile("rb")  # Read whole pickles even if several arrive together
+            touch(player_id)
+            deadlines.schedule(("heartbeat", player_id), time.monotonic() + HEARTBEAT_INTERVAL)
+
+            while True:
                 # Receive and decode data from client
-                raw_data = conn.recv(4096)  # Increased buffer size
-                if not raw_data:
-                    print(f"Player {player_id + 1} disconnected.")
-                    break
-
-                message = pickle.loads(raw_data)
+                message = pickle.load(reader)
                 print(f"Decoded message from Player {player_id + 1}: {message}")
-
-                # Handle placement phase
-                if message.get("type") == "place_ship" and phase == "placement":
-                    handle_place_ship(conn, player_id, message)
-
-                # Handle attack phase
-                elif message.get("type") == "attack" and phase == "combat":
-                    handle_attack(conn, player_id, message)
-
-            except Exception as e:
-                print(f"Error handling Player {player_id + 1}: {e}")
-                traceback.print_exc()
-                break
+                with game_lock:
+                    touch(player_id)  # Any message, heartbeat replies included, shows the client is alive
+                    handle_message(conn, player_id, message)
+
+        except (EOFError, OSError):  # Closed, reset, or shut down by forfeit()
+            print(f"Player {player_id + 1} disconnected.")
+            reason = "left the game."
+        except Exception as e:  # Unpickling errors from a garbled stream included
+            print(f"Error handling Player {player_id + 1}: {e}")
+            traceback.print_exc()
+            reason = "was disconnected after an error."
+
+        # The connection is about to close, so the opponent wins now rather than at the next heartbeat
+        with game_lock:
+            forfeit(player_id, f"Player {player_id + 1} {reason}")
 
     finally:
         conn.close()
         print(f"Connection with Player {player_id + 1} closed.")
 
+def handle_message(conn, player_id, message):
+    """Dispatch a decoded message from a player to the handler for the current phase."""
+    # Handle placement phase
+    if message.get("type") == "place_ship" and phase == "placement":
+        handle_place_ship(conn, player_id, message)
+
+    # Handle attack phase
+    elif message.get("type") == "attack" and phase == "combat":
+        handle_attack(conn, player_id, message)
+
+def touch(player_id):
+    """Push back a player's idle deadline."""
+    deadlines.schedule(("idle", player_id), time.monotonic() + IDLE_TIMEOUT)
+
+def start_turn_timer():
+    """Give the player whose turn it is TURN_TIMEOUT seconds to attack."""
+    if phase != "combat":
+        return  # A failed send already ended the match
+    deadlines.cancel(("turn", 1 - turn))
+    deadlines.schedule(("turn", turn), time.monotonic() + TURN_TIMEOUT)
+
+def drop_connection(conn):
+    """Shut a connection down so its handler's blocked read returns."""
+    try:
+        conn.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass  # Already closed
+
+def send_nowait(conn, message):
+    """Send a message without blocking, for players who may have stopped reading.
+
+    Returns False if the message could not be sent whole, e.g. because the
+    player's receive buffer is full.
+    """
+    data = pickle.dumps(message)
+    try:
+        return conn.send(data, getattr(socket, "MSG_DONTWAIT", 0)) == len(data)  # Windows lacks MSG_DONTWAIT
+    except OSError:  # BlockingIOError when the buffer is full
+        return False
+
+def send_message(player_id, message):
+    """Send a message to a player, forfeiting them if it cannot be sent without blocking.
+
+    Everything is sent under game_lock, so a player who has stopped reading
+    must not be able to stall the other handler or the reaper. Returns False
+    if the player forfeited.
+    """
+    if send_nowait(clients[player_id], message):
+        return True
+    forfeit(player_id, f"Player {player_id + 1} stopped responding.")
+    return False
+
+def forfeit(player_id, reason):
+    """End the match in the opponent's favour and disconnect both players."""
+    global phase, matches_reaped
+
+    if phase == "over":
+        return
+    phase = "over"
+    deadlines.clear()
+    matches_reaped += 1
+    winner_message = f"{reason} Player {2 - player_id} Wins!"
+    print(f"{winner_message} Matches reaped: {matches_reaped}")
+    if REPLAY_PATH and match_log["first"] is not None:  # Nothing to replay before combat starts
+        replay.append_game(REPLAY_PATH, match_log["layouts"], match_log["first"], 1 - player_id, match_log["shots"],
+                           forfeited=True)
+
+    for client in clients:
+        send_nowait(client, {"type": "game_over", "message": winner_message})  # The reaped player may be gone
+    for client in clients:
+        drop_connection(client)
+
+def reap_expired(now=None):
+    """Send due heartbeats and forfeit players whose idle or turn deadline has passed."""
+    now = time.monotonic() if now is None else now
+    for kind, player_id in deadlines.pop_expired(now):
+        if phase == "over":
+            break  # An earlier key in this batch ended the match
+        if kind == "heartbeat":
+            if not send_message(player_id, {"type": "heartbeat"}):
+                break
+            deadlines.schedule(("heartbeat", player_id), now + HEARTBEAT_INTERVAL)
+        elif kind == "idle":
+            forfeit(player_id, f"Player {player_id + 1} stopped responding.")
+        elif kind == "turn":
+            forfeit(player_id, f"Player {player_id + 1} ran out of time.")
+
+def reaper_loop():
+    """Single loop that services every deadline until the match is over."""
+    while phase != "over":
+        next_deadline = deadlines.next_deadline()
+        delay = HEARTBEAT_INTERVAL if next_deadline is None else next_deadline - time.monotonic()
+        time.sleep(min(max(delay, 0), 1))  # Wake at least once a second to notice the match ending
+        with game_lock:
+            reap_expired()
+
 def handle_place_ship(conn, player_id, message):
     """Handles ship placement for a player."""
     global phase, turn
@@ -78,59 +193,83 @@ def handle_place_ship(conn, player_id, message):
 
         # Validate placement
         if ship_name in ship_placements[player_id]:
-            conn.send(pickle.dumps({"type": "error", "message": "Ship already placed."}))
+            send_message(player_id, {"type": "error", "message": "Ship already placed."})
             return
         if not place_ship(player_boards[player_id], row, col, ships[ship_name], orientation, ship_symbols[ship_name]):
-            conn.send(pickle.dumps({"type": "error", "message": "Invalid placement."}))
+            send_message(player_id, {"type": "error", "message": "Invalid placement."})
             return
 
         # Update state and notify client
         ship_placements[player_id].add(ship_name)
-        conn.send(pickle.dumps({
+        match_log["layouts"][player_id][ship_name] = (row, col, orientation)
+        send_message(player_id, {
             "type": "ship_placed",
             "ship": ship_name,
             "coords": (row, col),
             "orientation": orientation,
             "symbol": ship_symbols[ship_name]
-        }))
+        })
 
         # Check if this player has finished placing all ships
         if len(ship_placements[player_id]) == len(ships):
-            conn.send(pickle.dumps({"type": "all_ships_placed"}))
+            send_message(player_id, {"type": "all_ships_placed"})
             print(f"Player {player_id + 1} has finished placing all ships.")
+            if phase == "over":
+                return  # A failed send forfeited the match
             
             # Check if both players have finished placing ships
             if all(len(ship_placements[i]) == len(ships) for i in range(2)):
                 phase = "combat"
                 turn = random.randint(0, 1)  # Randomly select which player goes first
+                match_log["first"] = turn
                 print(f"All players have placed their ships. Moving to combat phase. Player {turn + 1} starts.")
                 
                 # Send turn notifications to both players
                 for i in range(2):
                     if i == turn:
-                        clients[i].send(pickle.dumps({"type": "your_turn"}))
+                        send_message(i, {"type": "your_turn"})
                         print(f"Sent 'your_turn' to Player {i + 1}")
                     else:
-                        clients[i].send(pickle.dumps({"type": "wait_turn"}))
+                        send_message(i, {"type": "wait_turn"})
                         print(f"Sent 'wait_turn' to Player {i + 1}")
+                start_turn_timer()
             else:
                 # If the other player hasn't finished, send a waiting message
-                conn.send(pickle.dumps({"type": "wait_turn"}))
+                send_message(player_id, {"type": "wait_turn"})
 
     except Exception as e:
         print(f"Error during ship placement for Player {player_id + 1}: {e}")
         traceback.print_exc()
 
-def is_ship_sunk(player_id, ship_symbol):
+def is_ship_sunk(board, ship_symbol):
     """Check if a specific ship is completely sunk."""
-    for row in player_boards[player_id]:
+    for row in board:
         if ship_symbol.upper() in row:  # Check if any part of the ship is still intact
             return False
     return True
 
+def resolve_attack(board, row, col):
+    """Apply an attack to a board and return (result, sunk_symbol).
+
+    Hit cells are marked by lowercasing the ship symbol, so a cell that was
+    already hit counts as a miss. sunk_symbol is None unless the hit sank a ship.
+    """
+    target_cell = board[row][col]
+    if target_cell not in ship_symbols.values():
+        return "miss", None
+    board[row][col] = target_cell.lower()
+    if is_ship_sunk(board, target_cell):
+        return "hit", target_cell
+    return "hit", None
+
 def check_game_over(player_id):
     """Check if the game is over and send appropriate messages."""
+    global phase
+
     if ships_sunk[player_id] == len(ships):
+        phase = "over"
+        deadlines.clear()  # Nothing left to time out
+
         # Determine the winner
         winner_id = 1 - player_id
         winner_message = f"Player {winner_id + 1} Wins!"
@@ -138,9 +277,11 @@ def check_game_over(player_id):
         # Send game over message to both players
         game_over_msg = {"type": "game_over", "message": winner_message}
         for client in clients:
-            client.send(pickle.dumps(game_over_msg))
+            send_nowait(client, game_over_msg)  # The match is over either way
         
         print(winner_message)
+        if REPLAY_PATH:
+            replay.append_game(REPLAY_PATH, match_log["layouts"], match_log["first"], winner_id, match_log["shots"])
         return True
     return False
 
@@ -154,21 +295,23 @@ def handle_attack(conn, player_id, message):
 
     # Check if attack is valid
     if turn != player_id:
-        conn.send(pickle.dumps({"type": "error", "message": "Not your turn."}))
+        send_message(player_id, {"type": "error", "message": "Not your turn."})
         return
 
-    # Check if the attack hits or misses
-    target_cell = player_boards[opponent_id][row][col]
-    if target_cell in ship_symbols.values():
+    # Check if the attack hits or misses (a hit is marked on the opponent board)
+    result, sunk_symbol = resolve_attack(player_boards[opponent_id], row, col)
+    match_log["shots"].append((row, col, result == "hit"))
+    if result == "hit":
         print(f"Hit! Player {player_id + 1} hit Player {opponent_id + 1}'s ship.")
         attack_boards[player_id][row][col] = "X"  # Mark hit on attack board
-        player_boards[opponent_id][row][col] = player_boards[opponent_id][row][col].lower()  # Mark hit on opponent board
-        conn.send(pickle.dumps({"type": "attack_result", "result": "hit", "coords": (row, col)}))
-        clients[opponent_id].send(pickle.dumps({"type": "opponent_hit", "coords": (row, col)}))  # Notify defender
+        send_message(player_id, {"type": "attack_result", "result": "hit", "coords": (row, col)})
+        send_message(opponent_id, {"type": "opponent_hit", "coords": (row, col)})  # Notify defender
+        if phase == "over":
+            return  # A failed send forfeited the match
 
         # Check if the ship is sunk
-        if is_ship_sunk(opponent_id, target_cell):
-            print(f"Player {opponent_id + 1}'s ship {target_cell.upper()} has been sunk!")
+        if sunk_symbol:
+            print(f"Player {opponent_id + 1}'s ship {sunk_symbol} has been sunk!")
             ships_sunk[opponent_id] += 1
             
             # Check if game is over
@@ -176,18 +319,14 @@ def handle_attack(conn, player_id, message):
                 return
             
             # Notify both players about the sunk ship
-            sunk_notification = {"type": "ship_sunk", "message": f"Player {player_id + 1} has sunk Player {opponent_id + 1}'s {target_cell.upper()}!"}
-            for client in clients:
-                client.send(pickle.dumps(sunk_notification))
-
-            # Switch turn to the opponent
-            turn = opponent_id
-            notify_turn()
+            sunk_notification = {"type": "ship_sunk", "message": f"Player {player_id + 1} has sunk Player {opponent_id + 1}'s {sunk_symbol}!"}
+            for i in range(2):
+                send_message(i, sunk_notification)
     else:
         print(f"Miss! Player {player_id + 1} missed.")
         attack_boards[player_id][row][col] = "*"  # Mark miss on attack board
-        conn.send(pickle.dumps({"type": "attack_result", "result": "miss", "coords": (row, col)}))
-        clients[opponent_id].send(pickle.dumps({"type": "opponent_miss", "coords": (row, col)}))  # Notify defender
+        send_message(player_id, {"type": "attack_result", "result": "miss", "coords": (row, col)})
+        send_message(opponent_id, {"type": "opponent_miss", "coords": (row, col)})  # Notify defender
 
     # Switch turn
     turn = opponent_id
@@ -195,13 +334,14 @@ def handle_attack(conn, player_id, message):
 
 def notify_turn():
     """Notify both players whose turn it is."""
-    for i, client in enumerate(clients):
+    for i in range(len(clients)):
         if i == turn:
             print(f"Player {i + 1} notified: It's your turn.")
-            client.send(pickle.dumps({"type": "your_turn"}))
+            send_message(i, {"type": "your_turn"})
         else:
             print(f"Player {i + 1} notified: Wait for your turn.")
-            client.send(pickle.dumps({"type": "wait_turn"}))
+            send_message(i, {"type": "wait_turn"})
+    start_turn_timer()
 
 def place_ship(board, row, col, length, orientation, symbol):
     """Place a ship on the board if the placement is valid."""
@@ -218,17 +358,37 @@ def place_ship(board, row, col, length, orientation, symbol):
     return True
 
 # Initialize boards for both players
-for i in range(2):
-    player_boards[i] = [["_" for _ in range(map_size)] for _ in range(map_size)]
-    attack_boards[i] = [["_" for _ in range(map_size)] for _ in range(map_size)]
-
-# Accept connections from two clients
-for player_id in range(2):
-    try:
-        client_socket, addr = server.accept()
-        clients.append(client_socket)
-        print(f"Player {player_id + 1} connected from {addr}")
-        threading.Thread(target=handle_client, args=(client_socket, player_id)).start()
-    except Exception as e:
-        print(f"Error accepting connection for Player {player_id + 1}: {e}")
-        traceback.print_exc()
+reset_game()
+
+def main():
+    """Start the server and accept connections from two clients."""
+    # Set up server socket
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind((HOST, PORT))
+    server.listen(2)
+    print("Server started. Waiting for connections...")
+
+    # One thread services the heartbeats and timeouts of both players. It starts
+    # before the accept loop so the first player is kept alive while waiting.
+    threading.Thread(target=reaper_loop, name="reaper", daemon=True).start()
+
+    # Accept connections from two clients
+    for player_id in range(2):
+        try:
+            client_socket, addr = server.accept()
+            with game_lock:
+                if phase == "over":
+                    # The first player left before an opponent arrived, so there is no match to join
+                    print(f"Player {player_id + 1} connected from {addr} after the match ended.")
+                    send_nowait(client_socket, {"type": "game_over", "message": "The match has already ended."})
+                    client_socket.close()
+                    break
+                clients.append(client_socket)
+            print(f"Player {player_id + 1} connected from {addr}")
+            threading.Thread(target=handle_client, args=(client_socket, player_id)).start()
+        except Exception as e:
+            print(f"Error accepting connection for Player {player_id + 1}: {e}")
+            traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+# stats.py
+import math
+
+# Statistics shared by the tournament runner and the replay analyzer. Kept
+# apart from both so the analyzer does not import the server.
+
+def wilson_interval(wins, games, z=1.96):
+    """Return the Wilson score interval for a win rate (95% by default)."""
+    if games == 0:
+        return 0.0, 1.0
+    rate = wins / games
+    denominator = 1 + z * z / games
+    centre = (rate + z * z / (2 * games)) / denominator
+    margin = z * math.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games)) / denominator
+    return centre - margin, centre + margin
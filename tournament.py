@@ -0,0 +1,206 @@
+# tournament.py
+import argparse
+import csv
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from server2 import map_size, ships, ship_symbols, place_ship, resolve_attack
+from stats import wilson_interval
+
+# Tournament configuration
+GAMES_PER_PAIR = 1000
+CHUNK_SIZE = 250  # Games played per worker task
+CSV_FIELDS = ["seed", "player_a", "player_b", "winner", "first", "shots"]
+
+# Bot strategies
+# A strategy is a generator function taking a random.Random. It yields the
+# (row, col) to attack and receives the result ("hit"/"miss") of that attack.
+
+def random_bot(rng):
+    """Attack every cell once, in random order."""
+    cells = [(row, col) for row in range(map_size) for col in range(map_size)]
+    rng.shuffle(cells)
+    for cell in cells:
+        yield cell
+
+def parity_bot(rng):
+    """Attack a checkerboard pattern first, since every ship covers at least one of its cells."""
+    cells = [(row, col) for row in range(map_size) for col in range(map_size)]
+    rng.shuffle(cells)
+    cells.sort(key=lambda cell: (cell[0] + cell[1]) % 2)  # Stable sort keeps the shuffle within each colour
+    for cell in cells:
+        yield cell
+
+def hunt_target_bot(rng):
+    """Attack randomly until a hit, then work through the neighbours of every hit."""
+    cells = [(row, col) for row in range(map_size) for col in range(map_size)]
+    rng.shuffle(cells)
+    tried = set()
+    targets = []
+    while True:
+        if targets:
+            cell = targets.pop()
+        else:
+            cell = cells.pop()
+        if cell in tried:
+            continue
+        tried.add(cell)
+        result = yield cell
+        if result == "hit":
+            row, col = cell
+            for r, c in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+                if 0 <= r < map_size and 0 <= c < map_size and (r, c) not in tried:
+                    targets.append((r, c))
+
+strategies = {
+    "random": random_bot,
+    "parity": parity_bot,
+    "hunt_target": hunt_target_bot,
+}
+
+def random_layout(rng):
+    """Place every ship at a random valid position. Returns (board, layout)."""
+    board = [["_" for _ in range(map_size)] for _ in range(map_size)]
+    layout = {}
+    for ship_name, length in ships.items():
+        while True:
+            row, col = rng.randrange(map_size), rng.randrange(map_size)
+            orientation = rng.choice("HV")
+            if place_ship(board, row, col, length, orientation, ship_symbols[ship_name]):
+                layout[ship_name] = (row, col, orientation)
+                break
+    return board, layout
+
+def play_match(strategy_a, strategy_b, seed):
+    """Play one game between two strategies with the server's rules.
+
+    Returns (winner, first, shots) where winner and first are 0 for
+    strategy_a and 1 for strategy_b, and shots is the total number of attacks.
+    """
+    rng = random.Random(seed)
+    boards = [random_layout(rng)[0], random_layout(rng)[0]]
+    bots = [strategies[strategy_a](rng), strategies[strategy_b](rng)]
+    results = [None, None]  # Result of each bot's previous attack
+    ships_sunk = [0, 0]
+    turn = first = rng.randint(0, 1)
+    shots = 0
+
+    while True:
+        opponent_id = 1 - turn
+        row, col = bots[turn].send(results[turn])
+        results[turn], sunk_symbol = resolve_attack(boards[opponent_id], row, col)
+        shots += 1
+        if sunk_symbol:
+            ships_sunk[opponent_id] += 1
+            if ships_sunk[opponent_id] == len(ships):
+                return turn, first, shots
+        turn = opponent_id
+
+def play_chunk(strategy_a, strategy_b, first_seed, count):
+    """Play a batch of games in a worker process and return them as CSV rows."""
+    rows = []
+    for seed in range(first_seed, first_seed + count):
+        winner, first, shots = play_match(strategy_a, strategy_b, seed)
+        rows.append((seed, strategy_a, strategy_b, (strategy_a, strategy_b)[winner], first, shots))
+    return rows
+
+def schedule(names, games_per_pair, chunk_size, seed):
+    """Split every pairing of strategies into (strategy_a, strategy_b, first_seed, count) chunks."""
+    for pair_index, (strategy_a, strategy_b) in enumerate(itertools.combinations(names, 2)):
+        pair_seed = seed + pair_index * games_per_pair
+        for offset in range(0, games_per_pair, chunk_size):
+            yield strategy_a, strategy_b, pair_seed + offset, min(chunk_size, games_per_pair - offset)
+
+def run_tournament(path, names=None, games_per_pair=GAMES_PER_PAIR, chunk_size=CHUNK_SIZE, workers=None, seed=0):
+    """Play every pairing of strategies and stream the results to a CSV file.
+
+    At most two chunks per worker are in flight at once, and each chunk is
+    written out as soon as it finishes, so memory stays flat however many games are played.
+    """
+    names = list(names or strategies)
+    for name in names:
+        if name not in strategies:
+            raise ValueError(f"Unknown strategy: {name}")
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = 2 * workers
+    chunks = schedule(names, games_per_pair, chunk_size, seed)
+    games = 0
+    with open(path, "w", newline="") as f, ProcessPoolExecutor(max_workers=workers) as executor:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        pending = set()
+        while True:
+            for chunk in itertools.islice(chunks, max_pending - len(pending)):
+                pending.add(executor.submit(play_chunk, *chunk))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                rows = future.result()
+                writer.writerows(rows)
+                games += len(rows)
+            f.flush()
+    return games
+
+def summarize(path):
+    """Read a results file row by row and aggregate win rates per strategy and per pairing.
+
+    Returns {"strategies": {name: stats}, "pairs": {(a, b): stats}} where stats
+    holds games, wins, win_rate, ci_low, ci_high and (for pairings) avg_shots.
+    """
+    strategy_counts = {}  # name -> [games, wins]
+    pair_counts = {}  # (a, b) -> [games, wins for a, total shots]
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            a, b, winner = row["player_a"], row["player_b"], row["winner"]
+            pair = pair_counts.setdefault((a, b), [0, 0, 0])
+            pair[0] += 1
+            pair[1] += winner == a
+            pair[2] += int(row["shots"])
+            for name in (a, b):
+                counts = strategy_counts.setdefault(name, [0, 0])
+                counts[0] += 1
+                counts[1] += winner == name
+
+    def stats(games, wins):
+        low, high = wilson_interval(wins, games)
+        return {"games": games, "wins": wins, "win_rate": wins / games, "ci_low": low, "ci_high": high}
+
+    summary = {"strategies": {}, "pairs": {}}
+    for name, (games, wins) in strategy_counts.items():
+        summary["strategies"][name] = stats(games, wins)
+    for pair, (games, wins, shots) in pair_counts.items():
+        summary["pairs"][pair] = dict(stats(games, wins), avg_shots=shots / games)
+    return summary
+
+def print_summary(summary):
+    """Print win rates with 95% confidence intervals."""
+    print("Strategy        Games    Win rate  95% CI")
+    ranking = sorted(summary["strategies"].items(), key=lambda item: item[1]["win_rate"], reverse=True)
+    for name, s in ranking:
+        print(f"{name:<15} {s['games']:>6}  {s['win_rate']:>8.3f}  [{s['ci_low']:.3f}, {s['ci_high']:.3f}]")
+    print()
+    print("Pairing                     Games  A win rate  95% CI          Avg shots")
+    for (a, b), s in sorted(summary["pairs"].items()):
+        print(f"{a + ' vs ' + b:<27} {s['games']:>5}  {s['win_rate']:>10.3f}  [{s['ci_low']:.3f}, {s['ci_high']:.3f}]  {s['avg_shots']:>9.1f}")
+
+def main():
+    """Run a round-robin tournament from the command line."""
+    parser = argparse.ArgumentParser(description="Round-robin Battleship bot tournament.")
+    parser.add_argument("--out", default="tournament.csv", help="CSV file to stream results to")
+    parser.add_argument("--strategies", nargs="+", choices=sorted(strategies), help="strategies to enter (default: all)")
+    parser.add_argument("--games", type=int, default=GAMES_PER_PAIR, help="games per pairing")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="games per worker task")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    args = parser.parse_args()
+
+    games = run_tournament(args.out, args.strategies, args.games, args.chunk_size, args.workers, args.seed)
+    print(f"Played {games} games. Results written to {args.out}")
+    print_summary(summarize(args.out))
+
+if __name__ == "__main__":
+    main()